@@ -1,38 +1,88 @@
 import os
 import json
-import gspread
+import numpy as np
 import pandas as pd
-import joblib
+import onnxruntime as ort
 import streamlit as st
-import plotly.graph_objects as go
-from google.oauth2.service_account import Credentials
 
 # === APP CONFIG ===
-st.set_page_config(page_title="PeerSense", layout="centered")
+APP_TITLE = "PeerSense"
+CSS = """
+    <style>
+    .main {background-color: #f8f9fa; padding: 2rem;}
+    h1 {color: #2c3e50; font-family: 'Segoe UI', sans-serif;}
+    .stButton>button {
+        background-color: #4CAF50;
+        color: white;
+        border-radius: 12px;
+        padding: 10px 24px;
+        font-size: 16px;
+        border: none;
+    }
+    </style>
+"""
+# Styles and title go out as one element instead of two
+STATIC_HEADER = CSS + f"<h1>{APP_TITLE}</h1>"
+st.set_page_config(page_title=APP_TITLE, layout="centered")
 
 # === LOAD MODEL ===
-MODEL_PATH = "model2.pkl"
-try:
-    model = joblib.load(MODEL_PATH)
-except FileNotFoundError:
+MODEL_PATH = "model2.onnx"  # Exported from model2.pkl by export_onnx.py
+
+
+@st.cache_resource
+def load_model(path):
+    # Single-row inputs gain nothing from a thread pool; one thread avoids
+    # oversubscribing the host when several sessions predict at once
+    options = ort.SessionOptions()
+    options.intra_op_num_threads = 1
+    return ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+
+
+if not os.path.exists(MODEL_PATH):
     st.error(f"Model file '{MODEL_PATH}' not found.")
     st.stop()
 
+model = load_model(MODEL_PATH)
+MODEL_INPUTS = [model_input.name for model_input in model.get_inputs()]
+
+# Column order the pipeline was fitted on; the exported model takes one input per column
+FEATURE_COLUMNS = [
+    "ID", "Peer pressure score", "Age", "Gender", "Confidence Level", "Earned Recognition",
+    "Impulsivness", "Exclusion Anxiety", "People Pleaser", "Income level"
+]
+REQUIRED_FIELDS = np.array(FEATURE_COLUMNS, dtype=object)
+
+# skl2onnx names each input after its column with spaces replaced by underscores
+MODEL_INPUT_NAMES = {column: column.replace(" ", "_") for column in FEATURE_COLUMNS}
+if sorted(MODEL_INPUTS) != sorted(MODEL_INPUT_NAMES.values()):
+    st.error(f"Model inputs {MODEL_INPUTS} do not match the expected feature columns.")
+    st.stop()
+
+NUMERIC_COLUMNS = [
+    "Peer pressure score", "Age", "Confidence Level", "Earned Recognition",
+    "Impulsivness", "Exclusion Anxiety", "People Pleaser"
+]
+INCOME_MAP = {"low": 0.0, "medium": 1.0, "high": 2.0}
+RISK_MAP = {"low": 25, "medium": 50, "high": 75, "very high": 100}  # Keyed by the model's lowercase labels
+
 # === GOOGLE SHEETS CONFIG ===
 SHEET_URL = "https://docs.google.com/spreadsheets/d/1kuQP6jLVoZtMCaHXkWyn6LjvoNTKQEFynV-AKBVjPDs/edit?usp=sharing"  # Change to your sheet
 WORKSHEET_NAME = "IDS"  # Change to your worksheet name
+SCOPES = (
+    "https://spreadsheets.google.com/feeds",
+    "https://www.googleapis.com/auth/spreadsheets",
+    "https://www.googleapis.com/auth/drive.file",
+    "https://www.googleapis.com/auth/drive"
+)
 
 
 # === GOOGLE SHEETS AUTHENTICATION ===
-def authenticate_google_sheets():
-    try:
-        scope = [
-            "https://spreadsheets.google.com/feeds",
-            "https://www.googleapis.com/auth/spreadsheets",
-            "https://www.googleapis.com/auth/drive.file",
-            "https://www.googleapis.com/auth/drive"
-        ]
+@st.cache_resource
+def get_credentials():
+    # Imported here so the first page render does not wait on the Google client libraries
+    from google.oauth2.service_account import Credentials
 
+    try:
         # Load credentials from Streamlit Secrets
         if "GOOGLE_SERVICE_ACCOUNT_JSON" in st.secrets:
             service_account_data = st.secrets["GOOGLE_SERVICE_ACCOUNT_JSON"]
@@ -51,204 +101,307 @@ def authenticate_google_sheets():
         if "private_key" in creds_dict:
             creds_dict["private_key"] = creds_dict["private_key"].replace("\\n", "\n")
 
-        creds = Credentials.from_service_account_info(creds_dict, scopes=scope)
-        client = gspread.authorize(creds)
-        return client
+        return Credentials.from_service_account_info(creds_dict, scopes=SCOPES)
 
     except Exception as e:
         st.error(f"Error authenticating with Google Sheets: {e}")
         st.stop()
 
 
+@st.cache_resource
+def get_gspread_client():
+    import gspread
+
+    return gspread.authorize(get_credentials())
+
+
+@st.cache_resource
+def get_worksheet(sheet_url, worksheet_name):
+    return get_gspread_client().open_by_url(sheet_url).worksheet(worksheet_name)
+
+
 # === FETCH USER DATA FROM GOOGLE SHEET ===
+@st.cache_data(ttl=300, show_spinner=False)
+def get_sheet_index(sheet_url, worksheet_name):
+    worksheet = get_worksheet(sheet_url, worksheet_name)
+
+    # Header row and column A in one values.batchGet round trip; ID is normally the first column
+    header_rows, first_column = worksheet.batch_get(["1:1", "A:A"])
+    header = header_rows[0] if header_rows else []
+    id_column = header.index("ID") + 1
+    if id_column == 1:
+        ids = [row[0] if row else "" for row in first_column]
+    else:
+        ids = worksheet.col_values(id_column)
+
+    # Map each ID to its sheet row number; the first occurrence wins
+    row_numbers = {}
+    for row_number, value in enumerate(ids[1:], start=2):
+        row_numbers.setdefault(str(value).strip(), row_number)
+    return header, row_numbers
+
+
+@st.cache_data(ttl=300, show_spinner=False)
+def fetch_row(sheet_url, worksheet_name, user_id, row_number):
+    header, _ = get_sheet_index(sheet_url, worksheet_name)
+    worksheet = get_worksheet(sheet_url, worksheet_name)
+    values = worksheet.row_values(row_number)
+
+    # Keep the raw cell strings; numeric columns are converted in one pass by the caller.
+    # Blank and trailing cells become None so they are reported as missing fields.
+    row = {column: values[i] if i < len(values) and values[i] != "" else None
+           for i, column in enumerate(header)}
+
+    # Rows may have moved since the index was cached; raising keeps a stale read out of the cache
+    if str(row.get("ID") or "").strip() != user_id:
+        raise LookupError(f"Row {row_number} no longer holds ID {user_id}")
+    return row
+
+
+def find_row(sheet_url, worksheet_name, user_id):
+    for attempt in range(2):
+        _, row_numbers = get_sheet_index(sheet_url, worksheet_name)
+        row_number = row_numbers.get(user_id)
+
+        if row_number is not None:
+            try:
+                return fetch_row(sheet_url, worksheet_name, user_id, row_number)
+            except LookupError:
+                pass
+
+        # The ID is new or the sheet changed under the cached index; rebuild it and resolve once more.
+        # The rebuilt index is kept, so a mistyped ID costs one rebuild rather than two.
+        if attempt == 0:
+            get_sheet_index.clear()
+    return None
+
+
 def get_row_by_id_from_google_sheet(sheet_url, worksheet_name, user_id):
     try:
-        client = authenticate_google_sheets()
-        sheet = client.open_by_url(sheet_url)
-        worksheet = sheet.worksheet(worksheet_name)
-        data = pd.DataFrame(worksheet.get_all_records())
-
-        user_row = data[data["ID"].astype(str) == str(user_id)]
+        row = find_row(sheet_url, worksheet_name, str(user_id).strip())
 
-        if user_row.empty:
+        if row is None:
             return None, f"No record found for ID {user_id}"
 
-        return user_row.iloc[0], None
+        return pd.Series(row), None
     except Exception as e:
         return None, f"Error accessing Google Sheets: {e}"
 
 
-# === CLEAR CACHE ===
-def clear_cache():
-    st.cache_data.clear()
+# === PERSONALIZED TIPS ===
+TRAIT_TIPS = {
+    "Peer pressure score": [
+        "Pause and remind yourself of your values before responding to pressure.",
+        "Practice saying 'no' in different scenarios to build confidence.",
+        "Choose activities that align with your goals to reduce exposure to pressure."
+    ],
+    "Confidence Level": [
+        "List your past achievements to remind yourself of your strengths.",
+        "Set small, realistic goals and celebrate when you achieve them.",
+        "Practice positive self-talk to build confidence in tough situations."
+    ],
+    "Earned Recognition": [
+        "Remind yourself that recognition comes from consistent effort, not risky behavior.",
+        "Seek validation from within, not just from others.",
+        "Surround yourself with people who value you for who you are, not what you do."
+    ],
+    "Impulsivness": [
+        "Pause and count to 10 before making a quick decision.",
+        "Write down pros and cons before acting on an impulse.",
+        "Avoid environments where you’re more likely to make impulsive choices."
+    ],
+    "Exclusion Anxiety": [
+        "Remind yourself that true friends accept you as you are.",
+        "Engage in activities that boost self-esteem outside of peer validation.",
+        "Challenge negative thoughts about being excluded with positive affirmations."
+    ],
+    "People Pleaser": [
+        "Practice setting small boundaries, like politely declining small requests.",
+        "Remember that saying 'no' doesn’t make you a bad friend.",
+        "Focus on your needs as much as others’ to maintain balance."
+    ]
+}
+
+# Tips pre-rendered as Markdown lists so the results view only has to emit them
+TRAIT_TIPS_MARKDOWN = {
+    trait: f"**{trait}:**\n\n" + "\n".join(f"- {tip}" for tip in tips)
+    for trait, tips in TRAIT_TIPS.items()
+}
+
+
+# === PREDICTION ===
+def parse_income(value):
+    if isinstance(value, (int, float, np.number)):
+        return float(value)
+
+    # Sheet cells arrive as strings; labels are far more common than numbers
+    label = str(value).strip().casefold()
+    if label in INCOME_MAP:
+        return INCOME_MAP[label]
+    try:
+        return float(label)
+    except ValueError:
+        return 1.0
+
+
+# Builds the model feeds for any number of rows with plain numpy conversions.
+# `rows` maps each column to a sequence of values: a DataFrame or a dict of lists.
+def build_features(rows):
+    features = {column: np.asarray(rows[column], dtype=np.float64) for column in NUMERIC_COLUMNS}
+    features["ID"] = np.asarray(rows["ID"], dtype=np.float64)
+    features["Peer pressure score"] = features["Peer pressure score"] / 100
+    features["Age"] = np.trunc(features["Age"])
+    features["Gender"] = np.asarray(rows["Gender"], dtype=str).astype(object)
+    features["Income level"] = np.fromiter(map(parse_income, rows["Income level"]), dtype=np.float64)
+
+    return {MODEL_INPUT_NAMES[column]: features[column].reshape(-1, 1) for column in FEATURE_COLUMNS}
+
+
+def predict_labels(features):
+    return model.run(["label"], features)[0]
+
+
+# === RISK GAUGE ===
+# Only a handful of risk levels exist, so each gauge is built once and shared;
+# st.plotly_chart only serializes the figure and never mutates it
+@st.cache_resource
+def make_gauge(risk_value):
+    import plotly.graph_objects as go
+
+    fig = go.Figure(go.Indicator(
+        mode="gauge+number",
+        value=risk_value,
+        number={'suffix': "%", 'font': {'size': 36}},
+        title={'text': "Predicted Risk Level", 'font': {'size': 24}},
+        gauge={
+            'axis': {'range': [0, 100]},
+            'bar': {'color': "#e74c3c"},
+            'steps': [
+                {'range': [0, 25], 'color': "#2ecc71"},
+                {'range': [25, 50], 'color': "#f1c40f"},
+                {'range': [50, 75], 'color': "#e67e22"},
+                {'range': [75, 100], 'color': "#e74c3c"}
+            ],
+            'threshold': {
+                'line': {'color': "#34495e", 'width': 4},
+                'thickness': 0.75,
+                'value': risk_value
+            }
+        }
+    ))
+    fig.update_layout(height=300, margin={'t': 0, 'b': 0, 'l': 0, 'r': 0}, paper_bgcolor="#f8f9fa")
+    return fig
 
 
-# === APP STYLING ===
-st.markdown("""
-    <style>
-    .main {background-color: #f8f9fa; padding: 2rem;}
-    h1 {color: #2c3e50; font-family: 'Segoe UI', sans-serif;}
-    .stButton>button {
-        background-color: #4CAF50;
-        color: white;
-        border-radius: 12px;
-        padding: 10px 24px;
-        font-size: 16px;
-        border: none;
-    }
-    </style>
-""", unsafe_allow_html=True)
+# === TRAITS UI (modern layout) ===
+# Runs as a fragment so submitting the form reruns only this panel, not the fetch.
+# The sliders sit in a form, so moving several of them costs one rerun on submit.
+@st.fragment
+def traits_panel(rows, scores, risk_value):
+    st.subheader("Your Psychological Traits")
+
+    with st.form("traits"):
+        col1, col2 = st.columns(2)
+
+        with col1:
+            peer_pressure = st.slider("Peer Pressure Score (%)", 0, 100, int(scores["Peer pressure score"]))
+            confidence = st.slider("Confidence Level (%)", 0, 15, int(scores["Confidence Level"]))
+            earned_recognition = st.slider("Earned Recognition (%)", 0, 10, int(scores["Earned Recognition"]))
+
+        with col2:
+            impulsiveness = st.slider("Impulsiveness (%)", 0, 15, int(scores["Impulsivness"]))
+            exclusion_anxiety = st.slider("Exclusion Anxiety (%)", 0, 25, int(scores["Exclusion Anxiety"]))
+            people_pleaser = st.slider("People Pleaser (%)", 0, 25, int(scores["People Pleaser"]))
+
+        col3 = st.columns(1)[0]
+        with col3:
+            age = st.number_input("Age", min_value=12, max_value=25, value=int(scores["Age"]))
+
+        submitted = st.form_submit_button("Recompute risk")
+
+    if submitted:
+        try:
+            inputs = {
+                "Peer pressure score": peer_pressure,
+                "Age": age,
+                "Confidence Level": confidence,
+                "Earned Recognition": earned_recognition,
+                "Impulsivness": impulsiveness,
+                "Exclusion Anxiety": exclusion_anxiety,
+                "People Pleaser": people_pleaser
+            }
+            # Inputs start at the truncated sheet scores; only the ones the user moved replace
+            # the sheet values, so untouched fractional scores reach the model unchanged
+            edited = {**rows, **{column: [value] for column, value in inputs.items()
+                                 if value != int(scores[column])}}
+            prediction = predict_labels(build_features(edited))[0]
+            risk_value = RISK_MAP.get(prediction, 0)
+            st.success(f"Recomputed Risk Level: **{prediction.capitalize()}** ({risk_value}%)")
+        except Exception as e:
+            st.error(f"Error during prediction: {e}")
+
+    # === Personalized Tips Section ===
+    if risk_value is not None and risk_value > 50:
+        st.markdown("---")
+        st.subheader("💡 Personalized Tips to Handle Peer Pressure")
+
+        trait_values = {
+            "Peer pressure score": peer_pressure,
+            "Confidence Level": confidence,
+            "Earned Recognition": earned_recognition,
+            "Impulsivness": impulsiveness,
+            "Exclusion Anxiety": exclusion_anxiety,
+            "People Pleaser": people_pleaser
+        }
+
+        for trait, value in trait_values.items():
+            if value > 50:
+                st.markdown(TRAIT_TIPS_MARKDOWN[trait])
 
 
 # === MAIN UI ===
-st.title("PeerSense")
+st.markdown(STATIC_HEADER, unsafe_allow_html=True)
 st.subheader("Your responses have been analyzed and your substance use risk has been carefully evaluated.")
 st.markdown("Below you can explore insights into your Psychological Traits like how Peer Pressure, Confidence and other factors influenced your risk level")
 
 user_id = st.text_input("Enter your **User ID**:", placeholder="e.g., 12345")
 
 if user_id:
+    if st.button("Refresh data"):
+        get_worksheet.clear()
+        get_sheet_index.clear()
+        fetch_row.clear()
+
     if st.button("View Results"):
-        clear_cache()
         row_data, error_msg = get_row_by_id_from_google_sheet(SHEET_URL, WORKSHEET_NAME, user_id)
 
         if row_data is not None:
+            rows, scores, risk_value = None, None, None
             try:
-                peer_val = row_data.get("Peer pressure score")
-                age_val = row_data.get("Age")
-                gender_val = row_data.get("Gender")
-                conf_val = row_data.get("Confidence Level")
-                earned_val = row_data.get("Earned Recognition")
-                impulsive_val = row_data.get("Impulsivness")
-                excl_val = row_data.get("Exclusion Anxiety")
-                pp_val = row_data.get("People Pleaser")
-                income_raw = row_data.get("Income level")
-
                 # Validate missing fields
-                missing = [k for k, v in row_data.items() if pd.isna(v)]
-                if missing:
+                na_mask = row_data.reindex(REQUIRED_FIELDS).isna().to_numpy()
+                if na_mask.any():
+                    missing = REQUIRED_FIELDS[na_mask].tolist()
                     st.error("Missing fields in data: " + ", ".join(missing))
                     st.stop()
 
-                # Prepare input for model
-                income_map = {"Low": 0, "Medium": 1, "High": 2}
-                input_data = pd.DataFrame({
-                    "ID": [user_id],
-                    "Peer pressure score": [float(peer_val) / 100],
-                    "Age": [int(float(age_val))],
-                    "Gender": [str(gender_val)],
-                    "Confidence Level": [float(conf_val)],
-                    "Earned Recognition": [float(earned_val)],
-                    "Impulsivness": [float(impulsive_val)],
-                    "Exclusion Anxiety": [float(excl_val)],
-                    "People Pleaser": [float(pp_val)],
-                    "Income level": [float(income_raw) if isinstance(income_raw, (int, float))
-                                     else income_map.get(str(income_raw).capitalize(), 1)]
-                })
-
-                prediction = model.predict(input_data)[0]
-                risk_map = {"low": 25, "medium": 50, "high": 75, "very high": 100}
-                risk_value = risk_map.get(str(prediction).lower(), 0)
+                numeric = np.asarray(row_data[NUMERIC_COLUMNS], dtype=np.float64)
+                scores = dict(zip(NUMERIC_COLUMNS, numeric.tolist()))
+
+                # Single-row input as per-column lists, no DataFrame needed
+                rows = {column: [value] for column, value in row_data.items()}
+                prediction = predict_labels(build_features(rows))[0]
+                risk_value = RISK_MAP.get(prediction, 0)
 
                 # Gauge chart
-                fig = go.Figure(go.Indicator(
-                    mode="gauge+number",
-                    value=risk_value,
-                    number={'suffix': "%", 'font': {'size': 36}},
-                    title={'text': "Predicted Risk Level", 'font': {'size': 24}},
-                    gauge={
-                        'axis': {'range': [0, 100]},
-                        'bar': {'color': "#e74c3c"},
-                        'steps': [
-                            {'range': [0, 25], 'color': "#2ecc71"},
-                            {'range': [25, 50], 'color': "#f1c40f"},
-                            {'range': [50, 75], 'color': "#e67e22"},
-                            {'range': [75, 100], 'color': "#e74c3c"}
-                        ],
-                        'threshold': {
-                            'line': {'color': "#34495e", 'width': 4},
-                            'thickness': 0.75,
-                            'value': risk_value
-                        }
-                    }
-                ))
-                fig.update_layout(height=300, margin={'t': 0, 'b': 0, 'l': 0, 'r': 0}, paper_bgcolor="#f8f9fa")
-
-                st.plotly_chart(fig, use_container_width=True)
+                fig = make_gauge(risk_value)
+                st.plotly_chart(fig, use_container_width=True, key="risk_gauge")
                 st.success(f"Predicted Risk Level: **{prediction.capitalize()}** ({risk_value}%)")
 
             except Exception as e:
                 st.error(f"Error during prediction: {e}")
+
+            if scores is not None:
+                traits_panel(rows, scores, risk_value)
         else:
             st.error(error_msg)
-
-        # === Traits UI (modern layout) ===
-        st.subheader("Your Psychological Traits")
-        col1, col2 = st.columns(2)
-
-        with col1:
-            peer_pressure = st.slider("Peer Pressure Score (%)", 0, 100, int(float(peer_val)))
-            confidence = st.slider("Confidence Level (%)", 0, 15, int(float(conf_val)))
-            earned_recognition = st.slider("Earned Recognition (%)", 0, 10, int(float(earned_val)))
-
-        with col2:
-            impulsiveness = st.slider("Impulsiveness (%)", 0, 15, int(float(impulsive_val)))
-            exclusion_anxiety = st.slider("Exclusion Anxiety (%)", 0, 25, int(float(excl_val)))
-            people_pleaser = st.slider("People Pleaser (%)", 0, 25, int(float(pp_val)))
-
-        col3 = st.columns(1)[0]
-        with col3:
-            age = st.number_input("Age", min_value=12, max_value=25, value=int(float(age_val)))
-
-        # === Personalized Tips Section ===
-        if 'risk_value' in locals() and risk_value > 50:
-            st.markdown("---")
-            st.subheader("💡 Personalized Tips to Handle Peer Pressure")
-
-            trait_tips = {
-                "Peer pressure score": [
-                    "Pause and remind yourself of your values before responding to pressure.",
-                    "Practice saying 'no' in different scenarios to build confidence.",
-                    "Choose activities that align with your goals to reduce exposure to pressure."
-                ],
-                "Confidence Level": [
-                    "List your past achievements to remind yourself of your strengths.",
-                    "Set small, realistic goals and celebrate when you achieve them.",
-                    "Practice positive self-talk to build confidence in tough situations."
-                ],
-                "Earned Recognition": [
-                    "Remind yourself that recognition comes from consistent effort, not risky behavior.",
-                    "Seek validation from within, not just from others.",
-                    "Surround yourself with people who value you for who you are, not what you do."
-                ],
-                "Impulsivness": [
-                    "Pause and count to 10 before making a quick decision.",
-                    "Write down pros and cons before acting on an impulse.",
-                    "Avoid environments where you’re more likely to make impulsive choices."
-                ],
-                "Exclusion Anxiety": [
-                    "Remind yourself that true friends accept you as you are.",
-                    "Engage in activities that boost self-esteem outside of peer validation.",
-                    "Challenge negative thoughts about being excluded with positive affirmations."
-                ],
-                "People Pleaser": [
-                    "Practice setting small boundaries, like politely declining small requests.",
-                    "Remember that saying 'no' doesn’t make you a bad friend.",
-                    "Focus on your needs as much as others’ to maintain balance."
-                ]
-            }
-
-            trait_values = {
-                "Peer pressure score": peer_pressure,
-                "Confidence Level": confidence,
-                "Earned Recognition": earned_recognition,
-                "Impulsiveness": impulsiveness,
-                "Exclusion Anxiety": exclusion_anxiety,
-                "People Pleaser": people_pleaser
-            }
-
-            for trait, value in trait_values.items():
-                if value > 50:
-                    st.markdown(f"**{trait}:**")
-                    for tip in trait_tips.get(trait, []):
-                        st.markdown(f"- {tip}")
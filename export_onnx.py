@@ -0,0 +1,42 @@
+# Converts the fitted scikit-learn pipeline in model2.pkl into model2.onnx, which the
+# Streamlit app serves with ONNX Runtime. Run it offline whenever model2.pkl changes;
+# it needs joblib, scikit-learn==1.6.1 and skl2onnx on top of the app requirements.
+import joblib
+from onnx import TensorProto, helper
+from skl2onnx import convert_sklearn
+from skl2onnx.common.data_types import DoubleTensorType, StringTensorType
+
+PICKLE_PATH = "model2.pkl"
+ONNX_PATH = "model2.onnx"
+
+pipeline = joblib.load(PICKLE_PATH)
+
+# One input per fitted column so the ColumnTransformer keeps selecting by name.
+# Doubles keep the scaler at sklearn's precision.
+initial_types = [
+    (column, StringTensorType([None, 1]) if column == "Gender" else DoubleTensorType([None, 1]))
+    for column in pipeline.feature_names_in_
+]
+
+onnx_model = convert_sklearn(
+    pipeline,
+    initial_types=initial_types,
+    options={id(pipeline.named_steps["classifier"]): {"zipmap": False}},
+    target_opset=17,
+)
+
+# sklearn's trees compare float32 copies of their input against thresholds that skl2onnx
+# stores rounded down to float32. Casting the scaled features to float32 first reproduces
+# that comparison exactly; fed doubles, the trees disagree on a few rows in ten thousand.
+tree = next(node for node in onnx_model.graph.node if node.op_type == "TreeEnsembleClassifier")
+tree_input = tree.input[0]
+tree.input[0] = tree_input + "_float"
+onnx_model.graph.node.insert(
+    list(onnx_model.graph.node).index(tree),
+    helper.make_node("Cast", [tree_input], [tree.input[0]], to=TensorProto.FLOAT, name="TreeInputCast"),
+)
+
+with open(ONNX_PATH, "wb") as f:
+    f.write(onnx_model.SerializeToString())
+
+print(f"Wrote {ONNX_PATH}")